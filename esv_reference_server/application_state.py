@@ -2,7 +2,7 @@
 # Distributed under the Open BSV software license, see the accompanying file LICENSE
 
 from __future__ import annotations
-import asyncio, logging, os, struct, threading, time, weakref
+import asyncio, hashlib, json, logging, os, threading, time, weakref
 from collections import defaultdict
 from http import HTTPStatus
 from pathlib import Path
@@ -10,6 +10,7 @@ from pathlib import Path
 import aiohttp
 from aiohttp import web
 from electrumsv_database.sqlite import DatabaseContext
+from yarl import URL
 
 try:
     # Linux expects the latest package version of 3.35.4 (as of pysqlite-binary 0.4.6)
@@ -20,15 +21,17 @@ except ModuleNotFoundError:
     import sqlite3
 
 
-from .constants import ACCOUNT_MESSAGE_NAMES, Network, OutboundDataFlag
+from .constants import ACCOUNT_MESSAGE_NAMES, BINARY_REQUEST_HEADERS, \
+    HEADER_TIP_BROADCAST_BATCH_SIZE, HEADER_TIP_CACHE_SECONDS, JSON_REQUEST_HEADERS, Network, \
+    OutboundDataFlag, RESPONSE_HEADERS
 from .indexer_support import maintain_indexer_connection_async, unregister_unwanted_spent_outputs
 from .keys import create_regtest_server_keys, ServerKeys, get_server_keys
 from .msg_box.repositories import MsgBoxSQLiteRepository
 from . import sqlite_db
-from .types import AccountMessage, AccountWebsocketState, GeneralNotification, \
-    HeadersWSClient, MsgBoxWSClient, NotificationJsonData, OutboundDataLogRow, \
-    OutboundDataPendingRow, Outpoint
-from .utils import pack_account_message_bytes
+from .types import AccountMessage, AccountWebsocketState, ChainTipsSnapshot, \
+    GeneralNotification, HeaderSVTip, HeadersWSClient, MsgBoxWSClient, NotificationJsonData, \
+    OutboundDataLogRow, OutboundDataPendingRow, Outpoint, tip_height_struct
+from .utils import find_longest_chain_tip, pack_account_message_bytes
 
 
 logger = logging.getLogger("app-state")
@@ -43,6 +46,14 @@ def asyncio_task_callback(future: asyncio.Task[None]) -> None:
     future.result()
 
 
+def _create_aiohttp_session() -> aiohttp.ClientSession:
+    # The default connector caps the total number of connections at 100 and drops idle
+    # connections after 15 seconds, both of which hurt under bursts of proxied requests.
+    connector = aiohttp.TCPConnector(limit=0, limit_per_host=64, ttl_dns_cache=300,
+        keepalive_timeout=75, enable_cleanup_closed=True)
+    return aiohttp.ClientSession(connector=connector, headers=RESPONSE_HEADERS)
+
+
 class ApplicationState(object):
     server_keys: ServerKeys
 
@@ -79,7 +90,10 @@ class ApplicationState(object):
             self.server_keys = get_server_keys()
 
         self._exit_event = asyncio.Event()
-        self.aiohttp_session = aiohttp.ClientSession()
+        self.aiohttp_session = _create_aiohttp_session()
+        # HeaderSV gets a pool of its own so that the proxied header APIs keep their persistent
+        # connections regardless of what other outgoing requests are in progress.
+        self.header_sv_session = _create_aiohttp_session()
 
         self._account_websocket_state: dict[str, AccountWebsocketState] = {}
         self._account_websocket_id_by_account_id: dict[int, str] = {}  # account_id: ws_id
@@ -109,6 +123,27 @@ class ApplicationState(object):
         self.database_context.run_in_thread(_setup_database)
 
         self.header_sv_url = os.getenv('HEADER_SV_URL')
+        # HeaderSV endpoint URLs are built once here rather than for every request.
+        self.header_sv_tips_url = f"{self.header_sv_url}/api/v1/chain/tips"
+        self.header_sv_header_url_prefix = f"{self.header_sv_url}/api/v1/chain/header/"
+        self.header_sv_headers_by_height_url = \
+            URL(f"{self.header_sv_url}/api/v1/chain/header/byHeight")
+        # The size of the pieces upstream responses are forwarded to the client in.
+        self.chunked_buffer_size = int(os.getenv('CHUNKED_BUFFER_SIZE', '1024'))
+        # The longest chain tip as last seen by the header notification task.
+        self.best_tip_hash: str|None = None
+        self.best_tip_height: int|None = None
+        # The latest chain tips as polled by the header notification task, served by the tips API.
+        self.chain_tips_snapshot: ChainTipsSnapshot|None = None
+        # The most recent tip notification (raw header and height), when it was obtained and the
+        # hash of the tip it is for.
+        self._tip_notification_cache: tuple[float, str, bytes]|None = None
+        # Concurrent new header websocket connections all wait on the same upstream fetch.
+        self._tip_notification_future: asyncio.Task[tuple[str, bytes]]|None = None
+        # How many tip notifications have been broadcast and the last one, so that new header
+        # websocket connections do not repeat a tip they were already sent.
+        self.tip_broadcast_count = 0
+        self.last_broadcast_tip: bytes|None = None
 
         self._account_notifications_task: asyncio.Task[None]|None = None
         self._message_box_notifications_task: asyncio.Task[None]|None = None
@@ -155,6 +190,7 @@ class ApplicationState(object):
 
         self.logger.info("Closing HTTP sessions")
         await self.aiohttp_session.close()
+        await self.header_sv_session.close()
 
         # In theory this will block additional writes being put in place and empty the existing
         # queue. But the write dispatcher will block this thread, the async thread, while it
@@ -283,28 +319,59 @@ class ApplicationState(object):
         with self.headers_ws_clients_lock:
             del self.headers_ws_clients[ws_id]
 
+    async def broadcast_tip(self, tip_notification: bytes) -> None:
+        """
+        Send a tip notification to all connected header websockets.
+
+        The sends are done concurrently so that one slow client does not hold up the rest, in
+        batches so that a large number of clients does not starve the event loop.
+        """
+        with self.headers_ws_clients_lock:
+            ws_clients = [ ws_client for ws_client in self.headers_ws_clients.values()
+                if not ws_client.websocket.closed ]
+            self.tip_broadcast_count += 1
+            self.last_broadcast_tip = tip_notification
+        self.logger.debug("Sending tip notification to %d header websocket clients",
+            len(ws_clients))
+
+        for i in range(0, len(ws_clients), HEADER_TIP_BROADCAST_BATCH_SIZE):
+            batch = ws_clients[i:i+HEADER_TIP_BROADCAST_BATCH_SIZE]
+            results = await asyncio.gather(
+                *(ws_client.websocket.send_bytes(tip_notification) for ws_client in batch),
+                return_exceptions=True)
+            for ws_client, result in zip(batch, results):
+                if isinstance(result, ConnectionResetError):
+                    self.logger.error("Websocket[%s] disconnected", ws_client.ws_id)
+                elif isinstance(result, BaseException):
+                    self.logger.error("Websocket[%s] send failed", ws_client.ws_id,
+                        exc_info=result)
+            await asyncio.sleep(0)
+
     def get_aiohttp_session(self) -> aiohttp.ClientSession:
         return self.aiohttp_session
 
+    def get_header_sv_session(self) -> aiohttp.ClientSession:
+        return self.header_sv_session
+
     async def _header_notifications_task_async(self) -> None:
         """Emits any notifications from the queue to all connected websockets"""
         try:
-            session = self.get_aiohttp_session()
+            session = self.get_header_sv_session()
             current_best_hash = ""
 
             while not self._exit_event.is_set():
                 try:
-                    url_to_fetch = f"{self.header_sv_url}/api/v1/chain/tips"
-                    request_headers = {'Accept': 'application/json'}
-                    async with session.get(url_to_fetch, headers=request_headers) as resp:
+                    url_to_fetch = self.header_sv_tips_url
+                    async with session.get(url_to_fetch, headers=JSON_REQUEST_HEADERS) as resp:
                         assert resp.status == 200, resp.reason
-                        result = await resp.json()
-
-                    longest_chain_tip = None
-                    for tip in result:
-                        if tip['state'] == "LONGEST_CHAIN":
-                            longest_chain_tip = tip
-
+                        raw_result = await resp.read()
+                    if self.chain_tips_snapshot is None or \
+                            self.chain_tips_snapshot.body != raw_result:
+                        self.chain_tips_snapshot = ChainTipsSnapshot(raw_result,
+                            hashlib.sha256(raw_result).hexdigest())
+                    result = json.loads(raw_result)
+
+                    longest_chain_tip = find_longest_chain_tip(result)
                     if not longest_chain_tip:  # should never happen
                         raise ValueError("No longest chain tip in response")
 
@@ -312,6 +379,8 @@ class ApplicationState(object):
                         self.logger.debug("Got new chain tip: %s", longest_chain_tip)
                         current_best_hash = longest_chain_tip['header']['hash']
                         current_best_height = longest_chain_tip['height']
+                        self.best_tip_hash = current_best_hash
+                        self.best_tip_height = current_best_height
                     else:
                         await asyncio.sleep(1)
                         continue
@@ -319,10 +388,19 @@ class ApplicationState(object):
                     # logger.error("HeaderSV service is unavailable on %s", self.header_sv_url)
                     # Any new websocket connections will be notified when HeaderSV is back online
                     current_best_hash = ""
+                    self.best_tip_hash = None
+                    self.best_tip_height = None
+                    self.chain_tips_snapshot = None
                     await asyncio.sleep(1)
                     continue
                 except Exception:
                     logger.exception("Unexpected exception in header notification task")
+                    # The last known tip can no longer be trusted, and it is picked up again on
+                    # the next successful poll in the same way as after a connection failure.
+                    current_best_hash = ""
+                    self.best_tip_hash = None
+                    self.best_tip_height = None
+                    self.chain_tips_snapshot = None
                     await asyncio.sleep(1)
                     continue
 
@@ -330,30 +408,27 @@ class ApplicationState(object):
                         not len(self.get_account_websockets()):
                     continue
 
-                url_to_fetch = f"{self.header_sv_url}/api/v1/chain/header/{current_best_hash}"
-                request_headers = {'Accept': 'application/octet-stream'}
-                async with await session.get(url_to_fetch, headers=request_headers) as resp:
+                url_to_fetch = self.header_sv_header_url_prefix + current_best_hash
+                async with await session.get(url_to_fetch, headers=BINARY_REQUEST_HEADERS) as resp:
                     assert resp.status == 200, resp.reason
                     raw_header = await resp.read()
 
-                tip_notification = raw_header + struct.pack('<I', current_best_height)
+                tip_notification = raw_header + tip_height_struct.pack(current_best_height)
+                self._tip_notification_cache = (time.monotonic(), current_best_hash,
+                    tip_notification)
 
                 # Send new tip notification to all connected websocket clients
-                for ws_id, ws_client in self.get_headers_ws_clients().items():
-                    try:
-                        self.logger.debug("Sending msg to header websocket client ws_id: %s",
-                            ws_client.ws_id)
-                        await ws_client.websocket.send_bytes(tip_notification)
-                    except ConnectionResetError:
-                        self.logger.error("Websocket disconnected")
+                await self.broadcast_tip(tip_notification)
 
-                # Send new tip notification to all connected websocket clients
-                for ws_id, ws_client_general in self.get_account_websockets().items():
+                # Send new tip notification to all connected websocket clients. The message is the
+                # same for every client so it is serialised once up front.
+                general_notification_text = json.dumps(
+                    GeneralNotification(message_type="bsvapi.headers.tip", result=result))
+                for ws_client_general in list(self.get_account_websockets().values()):
                     try:
                         self.logger.debug("Sending msg to general websocket client ws_id: %s",
                             ws_client_general.ws_id)
-                        await ws_client_general.websocket.send_json(
-                            GeneralNotification(message_type="bsvapi.headers.tip", result=result))
+                        await ws_client_general.websocket.send_str(general_notification_text)
                     except ConnectionResetError:
                         self.logger.error("Websocket disconnected")
         except Exception:
@@ -361,6 +436,78 @@ class ApplicationState(object):
         finally:
             self.logger.info("Closing header push notifications thread")
 
+    async def get_tip_notification_async(self) -> bytes:
+        """
+        Get the tip notification for the current longest chain tip. This is the raw header
+        followed by the height, as sent to header websocket clients.
+
+        Raises `aiohttp.ClientError` if HeaderSV is unavailable.
+        """
+        # If the tip changes while a fetch is in progress, the fetched tip is out of date and the
+        # notification task may not send the new tip to a client that was not yet connected.
+        for _attempt in range(3):
+            block_hash, tip_notification = await self._get_tip_notification_entry_async()
+            if self.best_tip_hash is None or block_hash == self.best_tip_hash:
+                break
+        return tip_notification
+
+    async def _get_tip_notification_entry_async(self) -> tuple[str, bytes]:
+        if self._tip_notification_cache is not None:
+            cached_time, block_hash, tip_notification = self._tip_notification_cache
+            if time.monotonic() - cached_time < HEADER_TIP_CACHE_SECONDS and \
+                    (self.best_tip_hash is None or block_hash == self.best_tip_hash):
+                return block_hash, tip_notification
+
+        if self._tip_notification_future is None:
+            self._tip_notification_future = asyncio.create_task(
+                self._fetch_tip_notification_async())
+            self._tip_notification_future.add_done_callback(self._on_tip_notification_fetched)
+        # A cancelled waiter should not cancel the fetch the other waiters depend on.
+        return await asyncio.shield(self._tip_notification_future)
+
+    def _on_tip_notification_fetched(self, future: asyncio.Task[tuple[str, bytes]]) -> None:
+        self._tip_notification_future = None
+        # Retrieving the exception means it is not logged as unretrieved if all waiters are gone.
+        if not future.cancelled():
+            future.exception()
+
+    async def _fetch_tip_notification_async(self) -> tuple[str, bytes]:
+        # The notification task already tracks the tip from its regular polling of the tips, so
+        # only the header needs fetching. The tips are only fetched before the task has them.
+        best_tip_hash = self.best_tip_hash
+        best_tip_height = self.best_tip_height
+        if best_tip_hash is not None and best_tip_height is not None:
+            block_hash = best_tip_hash
+            block_height = best_tip_height
+        else:
+            longest_chain_tip = await self._fetch_longest_chain_tip_async()
+            block_hash = longest_chain_tip['header']['hash']
+            block_height = longest_chain_tip['height']
+
+        raw_header = await self._fetch_raw_header_async(block_hash)
+        tip_notification = raw_header + tip_height_struct.pack(block_height)
+        # Never replace the entry for a newer tip the notification task stored during the fetch.
+        if self.best_tip_hash is None or block_hash == self.best_tip_hash:
+            self._tip_notification_cache = (time.monotonic(), block_hash, tip_notification)
+        return block_hash, tip_notification
+
+    async def _fetch_longest_chain_tip_async(self) -> HeaderSVTip:
+        url_to_fetch = self.header_sv_tips_url
+        async with self.header_sv_session.get(url_to_fetch, headers=JSON_REQUEST_HEADERS) as resp:
+            resp.raise_for_status()
+            result = await resp.json()
+
+        longest_chain_tip = find_longest_chain_tip(result)
+        if not longest_chain_tip:  # should never happen
+            raise ValueError("No longest chain tip in response")
+        return longest_chain_tip
+
+    async def _fetch_raw_header_async(self, block_hash: str) -> bytes:
+        url_to_fetch = self.header_sv_header_url_prefix + block_hash
+        async with self.header_sv_session.get(url_to_fetch, headers=BINARY_REQUEST_HEADERS) as resp:
+            resp.raise_for_status()
+            return await resp.read()
+
     # Message Box Websocket Client Get/Add/Remove & Notify thread
     def get_msg_box_ws_clients(self) -> dict[str, MsgBoxWSClient]:
         with self.msg_box_ws_clients_lock:
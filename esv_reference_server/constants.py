@@ -4,6 +4,8 @@ Distributed under the Open BSV software license, see the accompanying file LICEN
 """
 
 from enum import IntEnum, IntFlag
+from types import MappingProxyType
+from typing import Mapping
 
 from bitcoinx import PrivateKey, sha256
 
@@ -24,6 +26,30 @@ REGTEST_IDENTITY_PUBLIC_KEY = REGTEST_IDENTITY_PRIVATE_KEY.public_key
 
 DEFAULT_DATABASE_NAME = 'esv_reference_server.sqlite'
 
+# How long a fetched chain tip notification is reused for new header websocket connections.
+HEADER_TIP_CACHE_SECONDS = 2.0
+# How long a new header websocket waits for the current tip before it is left to the next one.
+HEADER_TIP_FETCH_TIMEOUT_SECONDS = 10.0
+# Headers this far below the tip are considered safe from reorgs for HTTP caching purposes.
+HEADER_REORG_SAFETY_DEPTH = 6
+# The most headers a client can request from the headers by height API in one call.
+MAXIMUM_HEADERS_BY_HEIGHT_COUNT = 2000
+# Tip notifications are sent to this many header websockets at a time before yielding.
+HEADER_TIP_BROADCAST_BATCH_SIZE = 50
+HEADER_CACHE_CONTROL_IMMUTABLE = "public, max-age=31536000, immutable"
+HEADER_CACHE_CONTROL_NEAR_TIP = "public, max-age=5"
+# Heights map to different headers after a reorg, however deep, so these are never immutable.
+HEADER_CACHE_CONTROL_BURIED = "public, max-age=600"
+HEADER_CACHE_CONTROL_REVALIDATE = "no-cache, must-revalidate"
+
+# HTTP headers used for every HeaderSV request and proxied response, built once and shared.
+JSON_REQUEST_HEADERS: Mapping[str, str] = MappingProxyType({'Accept': 'application/json'})
+BINARY_REQUEST_HEADERS: Mapping[str, str] = \
+    MappingProxyType({'Accept': 'application/octet-stream'})
+RESPONSE_HEADERS: Mapping[str, str] = MappingProxyType({'User-Agent': 'ESV-Ref-Server'})
+BINARY_RESPONSE_HEADERS: Mapping[str, str] = MappingProxyType({
+    'Content-Type': 'application/octet-stream', 'User-Agent': 'ESV-Ref-Server'})
+
 
 # Around 0.5000 NZD as of 2021-11-21
 MINIMUM_FUNDING_VALUE = 210000
@@ -1,96 +1,207 @@
+import asyncio
+import hashlib
+import itertools
+import json
 import logging
-import struct
-import uuid
+import os
+import re
 
 import aiohttp
 import typing
-from typing import List
+from typing import List, Mapping
 from aiohttp import web
 from aiohttp.web_ws import WebSocketResponse
 from bitcoinx import pack_header, double_sha256, hash_to_hex_str, \
     hex_str_to_hash
 
+from esv_reference_server.constants import BINARY_REQUEST_HEADERS, BINARY_RESPONSE_HEADERS, \
+    HEADER_CACHE_CONTROL_BURIED, HEADER_CACHE_CONTROL_IMMUTABLE, HEADER_CACHE_CONTROL_NEAR_TIP, \
+    HEADER_CACHE_CONTROL_REVALIDATE, HEADER_REORG_SAFETY_DEPTH, HEADER_TIP_FETCH_TIMEOUT_SECONDS, \
+    JSON_REQUEST_HEADERS, MAXIMUM_HEADERS_BY_HEIGHT_COUNT, RESPONSE_HEADERS
 from esv_reference_server.errors import Error, APIErrors
-from esv_reference_server.types import HeadersWSClient, HeaderSVTip
+from esv_reference_server.types import HeadersWSClient, HeaderSVTip, tip_height_struct
+from esv_reference_server.utils import find_longest_chain_tip
 
 if typing.TYPE_CHECKING:
     from esv_reference_server.application_state import ApplicationState
 
 logger = logging.getLogger('handlers-headers')
 
+_block_hash_pattern = re.compile("[0-9a-fA-F]{64}")
 
-async def get_header(request: web.Request) -> web.Response:
+# Header websocket ids only need to be unique within this process.
+_headers_websocket_ids = itertools.count()
+
+
+def _make_etag(accept_type: str, tag: str) -> str:
+    # The JSON and binary representations of the same resource need distinct strong ETags.
+    if accept_type == 'application/octet-stream':
+        return f'"{tag}.bin"'
+    return f'"{tag}.json"'
+
+
+def _etag_matches(request: web.Request, etag: str) -> bool:
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is None:
+        return False
+    for value in if_none_match.split(','):
+        value = value.strip()
+        # `If-None-Match` uses the weak comparison function. `*` is not honoured, because the tags
+        # are checked before HeaderSV has confirmed that the resource exists.
+        if value.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+def _make_cache_headers(etag: str, cache_control: str) -> dict[str, str]:
+    # The JSON and binary representations share a URL, so shared caches must key on `Accept`.
+    return {'ETag': etag, 'Cache-Control': cache_control, 'Vary': 'Accept'}
+
+
+def _not_modified_response(etag: str, cache_control: str) -> web.Response:
+    return web.Response(status=304,
+        headers={**RESPONSE_HEADERS, **_make_cache_headers(etag, cache_control)})
+
+
+async def _stream_upstream_response(request: web.Request, upstream: aiohttp.ClientResponse,
+        response_headers: Mapping[str, str], chunk_size: int) -> web.StreamResponse|None:
+    """
+    Forward the upstream body to the client as it arrives rather than buffering all of it.
+
+    Returns `None` without having started a response if the upstream body is empty.
+    """
+    first_chunk = await upstream.content.read(chunk_size)
+    if not first_chunk:
+        return None
+
+    response = web.StreamResponse(status=200, reason='OK', headers=response_headers)
+    await response.prepare(request)
+    await response.write(first_chunk)
+    async for chunk in upstream.content.iter_chunked(chunk_size):
+        await response.write(chunk)
+    await response.write_eof()
+    return response
+
+
+def _get_by_height_cache_control(app_state: "ApplicationState", height: int, count: int) -> str:
+    top_height = height + count - 1
+    if app_state.best_tip_height is not None and \
+            top_height <= app_state.best_tip_height - HEADER_REORG_SAFETY_DEPTH:
+        return HEADER_CACHE_CONTROL_BURIED
+    return HEADER_CACHE_CONTROL_NEAR_TIP
+
+
+async def get_header(request: web.Request) -> web.StreamResponse:
     app_state: ApplicationState = request.app['app_state']
-    client_session = app_state.get_aiohttp_session()
+    client_session = app_state.get_header_sv_session()
 
     accept_type = request.headers.get('Accept', 'application/json')
     blockhash = request.match_info.get('hash')
     if not blockhash:
         raise web.HTTPBadRequest(reason=f"{APIErrors.MISSING_PATH_PARAMETER}: "
                                         "'hash' path parameter not supplied")
+    # Reject malformed hashes here rather than wasting a HeaderSV round-trip on them.
+    if _block_hash_pattern.fullmatch(blockhash) is None:
+        raise web.HTTPBadRequest(reason="Invalid 'hash' path parameter, expected 64 hex "
+            "characters")
+
+    # Headers are content-addressed by their hash, so a client with a copy has the latest copy.
+    etag = _make_etag(accept_type, blockhash)
+    if _etag_matches(request, etag):
+        return _not_modified_response(etag, HEADER_CACHE_CONTROL_IMMUTABLE)
 
     try:
-        url_to_fetch = f"{app_state.header_sv_url}/api/v1/chain/header/{blockhash}"
+        url_to_fetch = app_state.header_sv_header_url_prefix + blockhash
         if accept_type == 'application/octet-stream':
-            request_headers = {'Accept': 'application/octet-stream'}
-            async with client_session.get(url_to_fetch, headers=request_headers) as response:
-                result = await response.read()
-            if not result:
+            response_headers = {**BINARY_RESPONSE_HEADERS,
+                                **_make_cache_headers(etag, HEADER_CACHE_CONTROL_IMMUTABLE)}
+            async with client_session.get(url_to_fetch, headers=BINARY_REQUEST_HEADERS) \
+                    as response:
+                if response.status != 200:
+                    return web.Response(reason=response.reason, status=response.status)
+
+                stream_response = await _stream_upstream_response(request, response,
+                    response_headers, app_state.chunked_buffer_size)
+            if stream_response is None:
                 raise web.HTTPNotFound()
-            response_headers = {'Content-Type': 'application/octet-stream',
-                                'User-Agent': 'ESV-Ref-Server'}
-            return web.Response(body=result, status=200, reason='OK', headers=response_headers)
+            return stream_response
 
         # else: application/json
-        request_headers = {'Accept': 'application/json'}
-        async with client_session.get(url_to_fetch, headers=request_headers) as response:
+        async with client_session.get(url_to_fetch, headers=JSON_REQUEST_HEADERS) as response:
             if response.status != 200:
                 return web.Response(reason=response.reason, status=response.status)
 
-            result = await response.json()
-        response_headers = {'User-Agent': 'ESV-Ref-Server'}
-        return web.json_response(result, status=200, reason='OK', headers=response_headers)
+            result = await response.read()
+        response_headers = {**RESPONSE_HEADERS,
+                            **_make_cache_headers(etag, HEADER_CACHE_CONTROL_IMMUTABLE)}
+        return web.Response(body=result, status=200, reason='OK', headers=response_headers,
+            content_type='application/json')
     except aiohttp.ClientConnectorError:
         logger.error("Unavailable HeaderSV service request %s", request.rel_url.path)
         raise web.HTTPServiceUnavailable()
 
 
-async def get_headers_by_height(request: web.Request) -> web.Response:
+async def get_headers_by_height(request: web.Request) -> web.StreamResponse:
     app_state: ApplicationState = request.app['app_state']
-    client_session = app_state.get_aiohttp_session()
+    client_session = app_state.get_header_sv_session()
 
     accept_type = request.headers.get('Accept', 'application/json')
     params = request.rel_url.query
-    height = params.get('height', '0')
-    count = params.get('count', '1')
+    try:
+        height = int(params.get('height', '0'))
+        count = int(params.get('count', '1'))
+    except ValueError:
+        raise web.HTTPBadRequest(reason="Invalid 'height' or 'count' query parameter, expected "
+            "integers")
+    if not 0 <= height <= 0xFFFFFFFF:
+        raise web.HTTPBadRequest(reason="Invalid 'height' query parameter, out of range")
+    if not 1 <= count <= MAXIMUM_HEADERS_BY_HEIGHT_COUNT:
+        raise web.HTTPBadRequest(reason="Invalid 'count' query parameter, expected 1 to "
+            f"{MAXIMUM_HEADERS_BY_HEIGHT_COUNT}")
+
+    # The headers at a given height can change with the tip, so the tip is part of the tag.
+    cache_headers: dict[str, str] = {}
+    best_tip_hash = app_state.best_tip_hash
+    if best_tip_hash is not None:
+        etag = _make_etag(accept_type, f"{height}-{count}-{best_tip_hash}")
+        cache_control = _get_by_height_cache_control(app_state, height, count)
+        if _etag_matches(request, etag):
+            return _not_modified_response(etag, cache_control)
+        cache_headers = _make_cache_headers(etag, cache_control)
 
     try:
-        url_to_fetch = \
-            f"{app_state.header_sv_url}/api/v1/chain/header/byHeight?height={height}&count={count}"
+        url_to_fetch = app_state.header_sv_headers_by_height_url.with_query(height=height,
+            count=count)
         if accept_type == 'application/octet-stream':
-            request_headers = {'Accept': 'application/octet-stream'}
-            async with client_session.get(url_to_fetch, headers=request_headers) as response:
+            response_headers = {**BINARY_RESPONSE_HEADERS, **cache_headers}
+            async with client_session.get(url_to_fetch, headers=BINARY_REQUEST_HEADERS) \
+                    as response:
                 if response.status != 200:
                     return web.Response(reason=response.reason, status=response.status)
 
-                result = await response.read()
-            response_headers = {'Content-Type': 'application/octet-stream',
-                                'User-Agent': 'ESV-Ref-Server'}
-            return web.Response(body=result, status=200, reason='OK', headers=response_headers)
+                stream_response = await _stream_upstream_response(request, response,
+                    response_headers, app_state.chunked_buffer_size)
+            if stream_response is None:
+                return web.Response(status=200, reason='OK', headers=response_headers)
+            return stream_response
 
         # else: application/json
-        request_headers = {'Accept': 'application/json'}
-        async with client_session.get(url_to_fetch, headers=request_headers) as response:
-            result = await response.json()
-        response_headers = {'User-Agent': 'ESV-Ref-Server'}
-        return web.json_response(result, status=200, reason='OK', headers=response_headers)
+        async with client_session.get(url_to_fetch, headers=JSON_REQUEST_HEADERS) as response:
+            result = await response.read()
+        if response.status != 200:
+            # Errors are passed on as they are, without cache validators.
+            return web.Response(body=result, status=response.status, reason=response.reason,
+                headers=RESPONSE_HEADERS, content_type=response.content_type)
+        response_headers = {**RESPONSE_HEADERS, **cache_headers}
+        return web.Response(body=result, status=response.status, reason=response.reason,
+            headers=response_headers, content_type='application/json')
     except aiohttp.ClientConnectorError:
         logger.error("Unavailable HeaderSV service request %s", request.rel_url.path)
         raise web.HTTPServiceUnavailable()
 
 
-def _convert_json_tips_to_binary(result: List[HeaderSVTip]) -> bytearray:
-    headers_array = bytearray()
+def _convert_json_tips_to_binary(result: List[HeaderSVTip]) -> bytes:
+    headers_array: list[bytes] = []
     for tip in result:
         version = tip['header']['version']
         prev_hash = hex_str_to_hash(tip['header']['prevBlockHash'])
@@ -102,41 +213,65 @@ def _convert_json_tips_to_binary(result: List[HeaderSVTip]) -> bytearray:
         raw_header = pack_header(version, prev_hash, merkle_root, timestamp, target, nonce)
         block_hash = double_sha256(raw_header)
         assert hash_to_hex_str(block_hash) == tip['header']['hash']
-        headers_array += raw_header
-        headers_array += struct.pack("<I", tip['height'])
-    return headers_array
+        headers_array.append(raw_header)
+        headers_array.append(tip_height_struct.pack(tip['height']))
+    return b"".join(headers_array)
 
 
 async def get_chain_tips(request: web.Request) -> web.Response:
     app_state: ApplicationState = request.app['app_state']
-    client_session = app_state.get_aiohttp_session()
+    client_session = app_state.get_header_sv_session()
     accept_type = request.headers.get('Accept', 'application/json')
 
     params = request.rel_url.query
     longest_chain = params.get('longest_chain', '0')
 
-    try:
-        url_to_fetch = f"{app_state.header_sv_url}/api/v1/chain/tips"
-        request_headers = {'Accept': 'application/json'}
-        async with client_session.get(url_to_fetch, headers=request_headers) as response:
-            result: List[HeaderSVTip] = await response.json()
-        response_headers = {'User-Agent': 'ESV-Ref-Server'}
-
-        if longest_chain == '1':
-            for tip in result:
-                if tip['state'] == 'LONGEST_CHAIN':
-                    result = [tip]
-                    break
-
-        if accept_type == 'application/octet-stream':
-            headers_array = _convert_json_tips_to_binary(result)
-            return web.Response(body=headers_array, status=200, reason='OK',
-                headers=response_headers, content_type=accept_type)
-        return web.json_response(result, status=200, reason='OK', headers=response_headers)
-
-    except aiohttp.ClientConnectorError:
-        logger.error("Unavailable HeaderSV service request %s", request.rel_url.path)
-        raise web.HTTPServiceUnavailable()
+    # The header notification task keeps a recent copy of the tips, only ask HeaderSV if it has
+    # not got one (for instance if HeaderSV was unreachable on the last poll).
+    snapshot = app_state.chain_tips_snapshot
+    if snapshot is not None:
+        raw_result, digest = snapshot
+    else:
+        try:
+            url_to_fetch = app_state.header_sv_tips_url
+            async with client_session.get(url_to_fetch, headers=JSON_REQUEST_HEADERS) \
+                    as response:
+                raw_result = await response.read()
+        except aiohttp.ClientConnectorError:
+            logger.error("Unavailable HeaderSV service request %s", request.rel_url.path)
+            raise web.HTTPServiceUnavailable()
+        if response.status != 200:
+            # Errors are passed on as they are, without cache validators.
+            return web.Response(body=raw_result, status=response.status, reason=response.reason,
+                headers=RESPONSE_HEADERS, content_type=response.content_type)
+        digest = hashlib.sha256(raw_result).hexdigest()
+
+    # Tips change without notice, so clients must always revalidate with the current tag.
+    etag = _make_etag(accept_type, f"{digest}-{longest_chain}")
+    if _etag_matches(request, etag):
+        return _not_modified_response(etag, HEADER_CACHE_CONTROL_REVALIDATE)
+
+    response_headers = {**RESPONSE_HEADERS,
+                        **_make_cache_headers(etag, HEADER_CACHE_CONTROL_REVALIDATE)}
+    if longest_chain != '1' and accept_type != 'application/octet-stream':
+        # Nothing to filter or convert, the upstream body can be passed through as is.
+        return web.Response(body=raw_result, status=200, reason='OK',
+            headers=response_headers, content_type='application/json')
+
+    # This is deliberately not `orjson`, which silently decodes integers wider than 64 bits
+    # like the mainnet `chainWork` values as floats, and refuses to encode them.
+    result: List[HeaderSVTip] = json.loads(raw_result)
+
+    if longest_chain == '1':
+        longest_chain_tip = find_longest_chain_tip(result)
+        if longest_chain_tip is not None:
+            result = [longest_chain_tip]
+
+    if accept_type == 'application/octet-stream':
+        headers_array = _convert_json_tips_to_binary(result)
+        return web.Response(body=headers_array, status=200, reason='OK',
+            headers=response_headers, content_type=accept_type)
+    return web.json_response(result, status=200, reason='OK', headers=response_headers)
 
 
 class HeadersWebSocket(web.View):
@@ -146,14 +281,18 @@ class HeadersWebSocket(web.View):
     async def get(self) -> WebSocketResponse:
         """The communication for this is one-way - for header notifications only.
         Client messages will be ignored"""
-        ws = web.WebSocketResponse(heartbeat=30)
+        # Anything the client sends is discarded, so there is no need to buffer much of it. The
+        # 84 byte tip notifications are too small to gain anything from per-message compression.
+        ws = web.WebSocketResponse(heartbeat=30, max_msg_size=1024, compress=False)
         await ws.prepare(self.request)
-        ws_id = str(uuid.uuid4())
+        ws_id = f"{os.getpid()}-{next(_headers_websocket_ids)}"
         client = HeadersWSClient(ws_id=ws_id, websocket=ws)
-        self.request.app['app_state'].add_headers_ws_client(client)
+        app_state: ApplicationState = self.request.app['app_state']
+        app_state.add_headers_ws_client(client)
         self.logger.debug('%s connected. host=%s.', client.ws_id, self.request.host)
 
         try:
+            await self._send_chain_tip(app_state, client)
             await self._handle_new_connection(client)
             return ws
         except Error as e:
@@ -163,21 +302,45 @@ class HeadersWebSocket(web.View):
             if not ws.closed:
                 await ws.close()
             self.logger.debug("removing msg box websocket id: %s", ws_id)
-            self.request.app['app_state'].remove_headers_ws_client(ws_id)
+            app_state.remove_headers_ws_client(ws_id)
+
+    async def _send_chain_tip(self, app_state: "ApplicationState", client: HeadersWSClient) \
+            -> None:
+        """New clients are given the current tip rather than waiting for the next block."""
+        # The client is already registered, so it may be sent a new tip during the fetch.
+        broadcast_count = app_state.tip_broadcast_count
+        try:
+            # The receive loop has not started yet, so a hung HeaderSV must not hold it up.
+            tip_notification = await asyncio.wait_for(app_state.get_tip_notification_async(),
+                HEADER_TIP_FETCH_TIMEOUT_SECONDS)
+        except (aiohttp.ClientError, ValueError, asyncio.TimeoutError):
+            # The client will be notified of the next tip when HeaderSV is back online.
+            self.logger.error("Unable to get current tip from HeaderSV for %s", client.ws_id)
+            return
+        if broadcast_count != app_state.tip_broadcast_count and \
+                app_state.last_broadcast_tip == tip_notification:
+            return
+        try:
+            await client.websocket.send_bytes(tip_notification)
+        except ConnectionResetError:
+            # The client disconnected during the fetch, the receive loop will see it close.
+            self.logger.error("Websocket[%s] disconnected", client.ws_id)
 
     async def _handle_new_connection(self, client: HeadersWSClient) -> None:
-        async for msg in client.websocket:
+        log = self.logger
+        debug_enabled = log.isEnabledFor(logging.DEBUG)
+        websocket = client.websocket
+        while True:
+            msg = await websocket.receive()
             # Ignore all messages from client
             if msg.type == aiohttp.WSMsgType.text:
-                self.logger.debug('%s new headers websocket client sent: %s',
-                                  client.ws_id, msg.data)
-                # request_json = json.loads(msg.data)
-                # response_json = json.dumps(request_json)
-                # await client.websocket.send_str(response_json)
-
+                if debug_enabled:
+                    log.debug('%s new headers websocket client sent: %s', client.ws_id, msg.data)
             elif msg.type == aiohttp.WSMsgType.error:
                 # 'client.websocket.exception()' merely returns ClientWebSocketResponse._exception
                 # without a traceback. see aiohttp.ws_client.py:receive for details.
-                self.logger.error('ws connection closed with exception %s',
-                    client.websocket.exception())
-            return None
+                log.error('ws connection closed with exception %s', websocket.exception())
+                return
+            elif msg.type in (aiohttp.WSMsgType.close, aiohttp.WSMsgType.closing,
+                    aiohttp.WSMsgType.closed):
+                return
@@ -79,6 +79,13 @@ class HeaderSVTip(TypedDict):
     height: int
 
 
+class ChainTipsSnapshot(NamedTuple):
+    # The unmodified HeaderSV `/chain/tips` response body.
+    body: bytes
+    # The SHA256 hex digest of `body`.
+    digest: str
+
+
 class GeneralNotification(TypedDict):
     message_type: str
     result: Union[NotificationJsonData, str]
@@ -91,6 +98,8 @@ class AccountMessage(NamedTuple):
 
 
 
+# The height that follows the raw header in tip notifications and binary tips.
+tip_height_struct = struct.Struct("<I")
 outpoint_struct = struct.Struct(">32sI")
 output_spend_struct = struct.Struct(">32sI32sI32s")
 tip_filter_registration_struct = struct.Struct(">32sI")
@@ -9,6 +9,7 @@ from typing import Any, Optional
 from aiohttp import web
 
 from .constants import AccountMessageKind
+from .types import HeaderSVTip
 
 
 def create_external_id() -> str:
@@ -36,6 +37,16 @@ def _try_read_bearer_token_from_query(request: web.Request) -> Optional[str]:
     return auth_string
 
 
+def find_longest_chain_tip(tips: list[HeaderSVTip]) -> Optional[HeaderSVTip]:
+    """
+    HeaderSV lists one longest chain tip among any number of orphaned tips.
+    """
+    for tip in tips:
+        if tip['state'] == "LONGEST_CHAIN":
+            return tip
+    return None
+
+
 def pack_account_message_bytes(message_kind: AccountMessageKind, message_data: Any) -> bytes:
     """
     Serialise an outgoing account message as bytes.
@@ -12,6 +12,12 @@ from typing import cast, Optional
 
 from aiohttp import web
 
+try:
+    import uvloop
+except ModuleNotFoundError:
+    # uvloop does not support Windows, which falls back to the default asyncio event loop.
+    uvloop = None  # type: ignore[assignment]
+
 from esv_reference_server.application_state import ApplicationState
 from esv_reference_server.server_external import ExternalServer, get_external_server_application
 from esv_reference_server.server_internal import InternalServer, get_internal_server_application
@@ -51,6 +57,15 @@ def setup_logging(data_path: Path) -> None:
     logger.debug("File logging path=%s", full_log_path)
 
 
+def new_event_loop() -> asyncio.AbstractEventLoop:
+    """
+    Create a uvloop event loop where it is available, without changing the global policy.
+    """
+    if uvloop is not None:
+        return cast(asyncio.AbstractEventLoop, uvloop.new_event_loop())
+    return asyncio.new_event_loop()
+
+
 def load_dotenv(dotenv_path: Path) -> None:
     with open(dotenv_path, 'r') as f:
         lines = f.readlines()
@@ -158,7 +173,12 @@ async def main() -> None:
 
 if __name__ == "__main__":
     try:
-        asyncio.run(main())
+        # Use the faster uvloop event loop where it is available, without installing it as the
+        # global event loop policy.
+        if uvloop is not None:
+            uvloop.run(main())
+        else:
+            asyncio.run(main())
     except KeyboardInterrupt:
         pass
     except Exception:
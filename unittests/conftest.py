@@ -31,7 +31,7 @@ from esv_reference_server.constants import DEFAULT_DATABASE_NAME
 from esv_reference_server.errors import WebsocketUnauthorizedException
 from esv_reference_server.sqlite_db import delete_all_tables
 
-from server import main as application_main
+from server import main as application_main, new_event_loop
 
 
 logger = logging.getLogger("unittest")
@@ -60,6 +60,9 @@ STREAM_TERMINATION_BYTE = b"\x00"
 
 MODULE_DIR = Path(os.path.dirname(os.path.abspath(__file__)))
 
+# Reuse keep-alive connections to the test server rather than reconnecting for every call.
+HTTP_SESSION = requests.Session()
+
 CHANNEL_ID: str = ""
 CHANNEL_BEARER_TOKEN: str = ""
 CHANNEL_BEARER_TOKEN_ID: int = 0
@@ -70,20 +73,25 @@ CHANNEL_READ_ONLY_TOKEN_ID: int = 0
 
 def electrumsv_reference_server_thread() -> None:
     """Launches the ESV-Reference-Server to run in the background but with a test database"""
+    # The server gets a loop of its own so that the tests' own `asyncio.run` calls are unaffected.
+    loop = new_event_loop()
+    asyncio.set_event_loop(loop)
     try:
-        asyncio.run(application_main())
+        loop.run_until_complete(application_main())
         sys.exit(0)
     except KeyboardInterrupt:
         logger.debug("ElectrumSV Reference Server stopped")
     except Exception:
         logger.exception("unexpected exception in __main__")
     finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
         logger.info("ElectrumSV Reference Server stopped")
 
 
 def _no_auth(url: str, method: str) -> None:
     assert method.lower() in {'get', 'post', 'head', 'delete', 'put'}
-    request_call = getattr(requests, method.lower())
+    request_call = getattr(HTTP_SESSION, method.lower())
     result = request_call(url)
     assert result.status_code == HTTPStatus.BAD_REQUEST, result.reason
     assert result.reason is not None  # {"authorization": "is required"}
@@ -91,7 +99,7 @@ def _no_auth(url: str, method: str) -> None:
 
 def _wrong_auth_type(url: str, method: str) -> None:
     assert method.lower() in {'get', 'post', 'head', 'delete', 'put'}
-    request_call = getattr(requests, method.lower())
+    request_call = getattr(HTTP_SESSION, method.lower())
     # No auth -> 400 {"authorization": "is required"}
     headers = {}
     headers["Authorization"] = "Basic xyz"
@@ -102,7 +110,7 @@ def _wrong_auth_type(url: str, method: str) -> None:
 
 def _bad_token(url: str, method: str, headers: Optional[dict[str, str]] = None) -> None:
     assert method.lower() in {'get', 'post', 'head', 'delete', 'put'}
-    request_call = getattr(requests, method.lower())
+    request_call = getattr(HTTP_SESSION, method.lower())
     if not headers:
         headers = {}
     headers["Authorization"] = "Bearer bad bearer token"
@@ -115,7 +123,7 @@ def _successful_call(url: str, method: str, headers: Optional[dict[str, str]] =
                      request_body: Optional[dict[str, Any]] = None,
                      good_bearer_token: Optional[str] = None) -> requests.Response:
     assert method.lower() in {'get', 'post', 'head', 'delete', 'put'}
-    request_call = getattr(requests, method.lower())
+    request_call = getattr(HTTP_SESSION, method.lower())
     if not headers:
         headers = {}
     if good_bearer_token:
@@ -213,7 +221,7 @@ async def _subscribe_to_general_notifications_peer_channels(url: str, api_token:
 
 def _is_server_running(url: str) -> bool:
     try:
-        result = requests.get(url)
+        result = HTTP_SESSION.get(url)
         if result.status_code == 200:
             return True
         else:
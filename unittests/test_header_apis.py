@@ -53,6 +53,26 @@ class TestAiohttpRESTAPI:
 
         assert expected == result.json()
 
+    @pytest.mark.parametrize("query_params", ["?height=abc", "?height=-1", "?count=0",
+        "?count=2001", "?height=4294967296"])
+    def test_get_headers_by_height_invalid(self, query_params: str) -> None:
+        URL = "http://"+ TEST_EXTERNAL_HOST +":"+ str(TEST_EXTERNAL_PORT) + \
+            "/api/v1/headers/by-height" + query_params
+        HTTP_METHOD = 'get'
+        self.logger.debug("test_get_headers_by_height_invalid url: %s", URL)
+        result: requests.Response = _successful_call(URL, HTTP_METHOD, None)
+        assert result.status_code == 400, result.reason
+
+    @pytest.mark.parametrize("blockhash", ["abc", REGTEST_GENESIS_BLOCK_HASH[:-1] + "z",
+        REGTEST_GENESIS_BLOCK_HASH + "00"])
+    def test_get_header_invalid_hash(self, blockhash: str) -> None:
+        URL = "http://{host}:{port}/api/v1/headers/{hash}".format(host=TEST_EXTERNAL_HOST,
+            port=TEST_EXTERNAL_PORT, hash=blockhash)
+        HTTP_METHOD = 'get'
+        self.logger.debug("test_get_header_invalid_hash url: %s", URL)
+        result: requests.Response = _successful_call(URL, HTTP_METHOD, None)
+        assert result.status_code == 400, result.reason
+
     def test_get_header(self) -> None:
         expected = {
             'hash': '0f9188f13cb7b2c71f2a335e3a4fc328bf5beb436012afca590b1a11466e2206',
@@ -92,6 +112,82 @@ class TestAiohttpRESTAPI:
             pytest.skip(result.reason)
         assert expected == result.content
 
+    def test_get_header_not_modified(self) -> None:
+        URL = "http://{host}:{port}/api/v1/headers/{hash}".format(host=TEST_EXTERNAL_HOST,
+            port=TEST_EXTERNAL_PORT, hash=REGTEST_GENESIS_BLOCK_HASH)
+        HTTP_METHOD = 'get'
+        self.logger.debug("test_get_header_not_modified url: %s", URL)
+        request_headers = {'Accept': 'application/octet-stream'}
+        result: requests.Response = _successful_call(URL, HTTP_METHOD, request_headers)
+        if result.status_code == 503:
+            pytest.skip(result.reason)
+        etag = result.headers['ETag']
+        # Both representations are served from the same URL.
+        assert result.headers['Vary'] == 'Accept'
+
+        request_headers = {'Accept': 'application/octet-stream', 'If-None-Match': etag}
+        result = _successful_call(URL, HTTP_METHOD, request_headers)
+        assert result.status_code == 304
+        assert result.headers['ETag'] == etag
+        assert result.headers['Vary'] == 'Accept'
+        assert result.content == b''
+
+    def test_get_header_unknown_hash_wildcard_etag(self) -> None:
+        URL = "http://{host}:{port}/api/v1/headers/{hash}".format(host=TEST_EXTERNAL_HOST,
+            port=TEST_EXTERNAL_PORT, hash="00" * 32)
+        HTTP_METHOD = 'get'
+        self.logger.debug("test_get_header_unknown_hash_wildcard_etag url: %s", URL)
+        result: requests.Response = _successful_call(URL, HTTP_METHOD, {'If-None-Match': '*'})
+        if result.status_code == 503:
+            pytest.skip(result.reason)
+        assert result.status_code == 404
+
+    def test_get_headers_by_height_not_modified(self) -> None:
+        query_params = '?height=0&count=1'
+        URL = "http://"+ TEST_EXTERNAL_HOST +":"+ str(TEST_EXTERNAL_PORT) + \
+            "/api/v1/headers/by-height" + query_params
+        HTTP_METHOD = 'get'
+        self.logger.debug("test_get_headers_by_height_not_modified url: %s", URL)
+        result: requests.Response = _successful_call(URL, HTTP_METHOD, None)
+        if result.status_code == 503:
+            pytest.skip(result.reason)
+        if 'ETag' not in result.headers:
+            pytest.skip("The header notification task has not seen the tip yet")
+        etag = result.headers['ETag']
+        assert 'immutable' not in result.headers['Cache-Control']
+        assert result.headers['Vary'] == 'Accept'
+
+        result = _successful_call(URL, HTTP_METHOD, {'If-None-Match': etag})
+        assert result.status_code == 304
+        assert result.headers['ETag'] == etag
+        assert result.headers['Vary'] == 'Accept'
+        assert result.content == b''
+
+        # The binary representation of the same headers must not match the JSON tag.
+        request_headers = {'Accept': 'application/octet-stream', 'If-None-Match': etag}
+        result = _successful_call(URL, HTTP_METHOD, request_headers)
+        assert result.status_code == 200
+        assert result.headers['ETag'] != etag
+
+    def test_get_chain_tips_not_modified(self) -> None:
+        query_params = '?longest_chain=1'
+        URL = "http://"+ TEST_EXTERNAL_HOST +":"+ str(TEST_EXTERNAL_PORT) + \
+            "/api/v1/headers/tips" + query_params
+        HTTP_METHOD = 'get'
+        self.logger.debug("test_get_chain_tips_not_modified url: %s", URL)
+        result: requests.Response = _successful_call(URL, HTTP_METHOD, None)
+        if result.status_code == 503:
+            pytest.skip(result.reason)
+        etag = result.headers['ETag']
+        assert result.headers['Cache-Control'] == "no-cache, must-revalidate"
+        assert result.headers['Vary'] == 'Accept'
+
+        result = _successful_call(URL, HTTP_METHOD, {'If-None-Match': etag})
+        assert result.status_code == 304
+        assert result.headers['ETag'] == etag
+        assert result.headers['Vary'] == 'Accept'
+        assert result.content == b''
+
     def test_get_chain_tips_json(self) -> None:
         query_params = '?longest_chain=1'
         URL = "http://"+ TEST_EXTERNAL_HOST +":"+ str(TEST_EXTERNAL_PORT) + \
@@ -153,6 +249,29 @@ class TestAiohttpRESTAPI:
             self.logger.exception("Unexpected exception in _subscribe_to_headers_notifications")
             return False
 
+    def test_headers_websocket_initial_tip(self) -> None:
+        query_params = '?longest_chain=1'
+        URL = "http://"+ TEST_EXTERNAL_HOST +":"+ str(TEST_EXTERNAL_PORT) + \
+            "/api/v1/headers/tips" + query_params
+        HTTP_METHOD = 'get'
+        self.logger.debug("test_headers_websocket_initial_tip url: %s", URL)
+        request_headers = {'Accept': 'application/octet-stream'}
+        result: requests.Response = _successful_call(URL, HTTP_METHOD, request_headers)
+        if result.status_code == 503:
+            pytest.skip(result.reason)
+        # The binary longest chain tip is the same raw header and height as a tip notification.
+        expected_tip_notification = result.content
+
+        async def main() -> None:
+            async with aiohttp.ClientSession() as session:
+                async with session.ws_connect(WS_URL_HEADERS, timeout=5.0) as ws:
+                    msg = await ws.receive(timeout=5.0)
+                    assert msg.type == aiohttp.WSMsgType.BINARY
+                    _assert_tip_notification_structure(msg.data)
+                    assert msg.data == expected_tip_notification
+
+        asyncio.run(main())
+
     def test_headers_websocket(self) -> Optional[Skipped]:
         # Skip if HeaderSV APIs unavailable
         query_params = '?longest_chain=1'
@@ -189,12 +308,14 @@ class TestAiohttpRESTAPI:
             return None
 
         async def main() -> Optional[Skipped]:
-            EXPECTED_MSG_COUNT = 2
+            EXPECTED_BLOCK_COUNT = 2
+            # The current tip is sent on connecting, before any of the mined block notifications.
+            EXPECTED_MSG_COUNT = EXPECTED_BLOCK_COUNT + 1
 
             completion_event = asyncio.Event()
             fut1 = asyncio.create_task(wait_on_sub(EXPECTED_MSG_COUNT, completion_event))
             await asyncio.sleep(3)
-            result = await mine_blocks(EXPECTED_MSG_COUNT)
+            result = await mine_blocks(EXPECTED_BLOCK_COUNT)
             if result == "SKIP":
                 fut1.cancel()
                 return pytest.skip("Bitcoin Regtest node unavailable")
@@ -30,8 +30,8 @@ from esv_reference_server.errors import WebsocketUnauthorizedException
 from esv_reference_server import sqlite_db
 
 from .conftest import _wrong_auth_type, _bad_token, _successful_call, _no_auth, \
-    _subscribe_to_general_notifications_peer_channels, TEST_EXTERNAL_HOST, TEST_HREF_HOST, \
-    TEST_HREF_PORT, TEST_EXTERNAL_PORT, WS_URL_GENERAL
+    _subscribe_to_general_notifications_peer_channels, HTTP_SESSION, TEST_EXTERNAL_HOST, \
+    TEST_HREF_HOST, TEST_HREF_PORT, TEST_EXTERNAL_PORT, WS_URL_GENERAL
 
 WS_URL_TEMPLATE_MSG_BOX = "ws://"+ TEST_EXTERNAL_HOST +":"+ str(TEST_EXTERNAL_PORT) + \
     "/api/v1/channel/{channelid}/notify"
@@ -127,7 +127,7 @@ class TestAiohttpRESTAPI:
 
     def test_ping(self) -> None:
         URL = "http://{host}:{port}/".format(host=TEST_EXTERNAL_HOST, port=TEST_EXTERNAL_PORT)
-        result = requests.get(URL)
+        result = HTTP_SESSION.get(URL)
         assert result.text is not None
 
     def test_create_new_channel(self) -> None: